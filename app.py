@@ -1,22 +1,51 @@
 # Emotion Wallpaper Engine - Lightweight API (No ML)
 from fastapi import FastAPI, UploadFile, File, Query, Request, Body
-from fastapi.responses import Response, JSONResponse
+from fastapi.responses import Response, JSONResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError, field_validator
 
-from PIL import Image
+from PIL import Image, features
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+import asyncio
 import numpy as np
 import io
 import random
 import httpx
 import hashlib
+import sqlite3
+import tempfile
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
 import os
 
+from backend.wallpaper import generate_wallpaper
+from backend.observability import (
+    REGISTRY, PROMETHEUS_CONTENT_TYPE, ENCODE_DURATION, RENDER_DURATION,
+    add_request_metrics, monitor_event_loop_lag, get_logger,
+)
+
+logger = get_logger("emotion_wallpaper")
+
 # ==================================================
 # App Init
 # ==================================================
-app = FastAPI(title="Emotion Wallpaper Engine (Client-Side AI)")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-render the offline pool in the background; startup isn't delayed
+    fill_task = asyncio.create_task(fill_offline_pool())
+    lag_task = asyncio.create_task(monitor_event_loop_lag())
+    yield
+    fill_task.cancel()
+    lag_task.cancel()
+    for task in list(_background_tasks):
+        task.cancel()
+
+
+app = FastAPI(title="Emotion Wallpaper Engine (Client-Side AI)", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,22 +53,67 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Detected-Emotion"],
+    expose_headers=["X-Detected-Emotion", "ETag", "Content-Location", "Content-Range", "Accept-Ranges"],
 )
+add_request_metrics(app)
+
+# App Target Emotions
+EMOTIONS = ["angry", "disgust", "fear", "happy", "neutral", "sad", "surprise"]
+
+# ==================================================
+# Output Formats (format -> extension, media type, encoder options)
+# ==================================================
+OUTPUT_FORMATS = {
+    "JPEG": (".jpg", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+    "WEBP": (".webp", "image/webp", {"quality": 80, "method": 4}),
+}
+try:
+    if features.check("avif"):
+        OUTPUT_FORMATS["AVIF"] = (".avif", "image/avif", {"quality": 60})
+except ValueError:
+    # Older Pillow without the avif feature flag
+    pass
+
+MEDIA_TYPES = {ext: media_type for ext, media_type, _ in OUTPUT_FORMATS.values()}
+
+MAX_DIMENSION = 3840  # 4K UHD width
+DEFAULT_SIZE = (1920, 1080)
+
 
 # ==================================================
 # Data Models
 # ==================================================
 class EmotionRequest(BaseModel):
-    emotion: str
+    emotion: str = "neutral"
+    width: int | None = Field(default=None, ge=16, le=MAX_DIMENSION)
+    height: int | None = Field(default=None, ge=16, le=MAX_DIMENSION)
+    format: str | None = None
 
-# App Target Emotions
-EMOTIONS = ["angry", "disgust", "fear", "happy", "neutral", "sad", "surprise"]
+    @field_validator("format")
+    @classmethod
+    def check_format(cls, value: str | None) -> str | None:
+        if value is None:
+            return None
+        value = value.upper()
+        if value == "JPG":
+            value = "JPEG"
+        if value not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported format, expected one of {sorted(OUTPUT_FORMATS)}")
+        return value
+
+    @property
+    def wants_variant(self) -> bool:
+        return self.width is not None or self.height is not None or self.format is not None
 
 # Cache Directory
-CACHE_DIR = Path("public/wallpapers")
+CACHE_DIR = Path(os.environ.get("WALLPAPER_CACHE_DIR", "public/wallpapers"))
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
+# Cached files are content-addressed (<hash>.jpg), so their URLs never change meaning
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# /api/emotion picks a new wallpaper each call; clients must revalidate
+EMOTION_CACHE_CONTROL = "no-cache"
+
 
 # ==================================================
 # 🎨 20 UNIQUE SEARCH TERMS PER EMOTION
@@ -195,19 +269,274 @@ DIRECT_IMAGE_URLS = {
 }
 
 
-# Track used photos per emotion for round-robin (no repeats)
-_used_indices: dict[str, int] = {}
-_seen_hashes: dict[str, set] = {}
+# Upstream origins (overridable, e.g. to point benchmarks at a local stub)
+UNSPLASH_CDN = "https://images.unsplash.com"
+UNSPLASH_CDN_URL = os.environ.get("UNSPLASH_CDN_URL", UNSPLASH_CDN).rstrip("/")
+POLLINATIONS_API_URL = os.environ.get("POLLINATIONS_API_URL", "https://image.pollinations.ai").rstrip("/")
 
 MAX_CACHED_PER_EMOTION = 30
+MAX_VARIANTS_PER_EMOTION = 4 * MAX_CACHED_PER_EMOTION  # LRU-evicted derivative files
+VARIANT_LOCK_STALE_S = 60.0  # a render lock older than this belongs to a dead worker
 MAX_RETRIES = 5
 
+# Perceptual duplicate detection
+DUPLICATE_DISTANCE = 10  # max differing bits (of 64) to count as the same photo
+
+
+def seen_window(emotion: str) -> int:
+    """
+    How many rotation slots back a hash counts as "seen": one rotation minus one,
+    so the URL being fetched never matches its own previous fetch.
+    """
+    return max(1, len(DIRECT_IMAGE_URLS.get(emotion, DIRECT_IMAGE_URLS["neutral"])) - 1)
+
 
 def get_image_hash(image_bytes: bytes) -> str:
-    """SHA256 hash for duplicate detection."""
+    """SHA256 hash for content-addressed cache filenames."""
     return hashlib.sha256(image_bytes).hexdigest()[:16]
 
 
+def write_atomic(path: Path, data: bytes) -> None:
+    """
+    Write via a temp file + os.replace so other workers never see a partial file
+    (cache files are served from disk under strong ETags / immutable URLs).
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def get_perceptual_hash(image_bytes: bytes) -> int:
+    """
+    64-bit dHash: survives re-encoding and resizing, unlike a byte hash.
+    JPEGs are decoded at reduced size via draft() since we only need a 9x8 thumbnail.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img.draft("L", (64, 64))
+        thumb = img.convert("L").resize((9, 8), Image.Resampling.BILINEAR)
+    pixels = np.asarray(thumb, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class PerceptualIndex:
+    """
+    Multi-index hash over 64-bit perceptual hashes with LRU eviction.
+    Each hash is split into max_distance + 1 chunks; any hash within
+    max_distance bits must match at least one chunk exactly (pigeonhole),
+    so a lookup only compares against a few small buckets.
+    Each hash carries a stamp (e.g. rotation slot) for expire().
+    """
+
+    def __init__(self, capacity: int, max_distance: int):
+        self.capacity = capacity
+        self.max_distance = max_distance
+        chunk_count = max_distance + 1
+        bounds = [round(i * 64 / chunk_count) for i in range(chunk_count + 1)]
+        self._chunks = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(bounds, bounds[1:])]
+        self._buckets: list[dict[int, set[int]]] = [{} for _ in self._chunks]
+        self._recent: OrderedDict[int, int] = OrderedDict()  # hash -> stamp, oldest first
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def find_near(self, value: int) -> int | None:
+        """Return an indexed hash within max_distance bits of value, if any."""
+        for (shift, mask), buckets in zip(self._chunks, self._buckets):
+            for candidate in buckets.get((value >> shift) & mask, ()):
+                if (candidate ^ value).bit_count() <= self.max_distance:
+                    return candidate
+        return None
+
+    def add(self, value: int, stamp: int = 0) -> None:
+        """Insert (or refresh) a hash as most recent, evicting the oldest past capacity."""
+        if value in self._recent:
+            self._recent[value] = max(stamp, self._recent[value])
+            self._recent.move_to_end(value)
+            return
+
+        self._recent[value] = stamp
+        for (shift, mask), buckets in zip(self._chunks, self._buckets):
+            buckets.setdefault((value >> shift) & mask, set()).add(value)
+
+        while len(self._recent) > self.capacity:
+            oldest, _ = self._recent.popitem(last=False)
+            self._discard(oldest)
+
+    def expire(self, min_stamp: int) -> None:
+        """Drop hashes whose latest stamp is below min_stamp."""
+        for value in [value for value, stamp in self._recent.items() if stamp < min_stamp]:
+            del self._recent[value]
+            self._discard(value)
+
+    def _discard(self, value: int) -> None:
+        for (shift, mask), buckets in zip(self._chunks, self._buckets):
+            key = (value >> shift) & mask
+            bucket = buckets[key]
+            bucket.discard(value)
+            if not bucket:
+                del buckets[key]
+
+
+# ==================================================
+# 🔁 SHARED STATE (rotation + dedupe across workers)
+# ==================================================
+# SQLite in WAL mode: shared by every `uvicorn --workers N` process on the host,
+# no external service needed.
+STATE_DB = Path(os.environ.get("EMOTION_STATE_DB", ".cache/emotion_state.sqlite3"))
+
+
+def _to_signed64(value: int) -> int:
+    """SQLite INTEGER is signed 64-bit; perceptual hashes are unsigned."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class SharedState:
+    """
+    Rotation counters and recently seen perceptual hashes, shared across processes.
+    Hashes are stamped with the rotation slot they were fetched at and expire
+    after seen_window() slots, so the table never holds more than one rotation.
+    Each process keeps a local PerceptualIndex per emotion and pulls only the
+    rows added since its last sync (by seq), so a lookup costs one indexed query.
+    Methods block on SQLite (up to the busy timeout under write contention), so
+    async callers run them via run_in_threadpool; a lock serializes the shared connection.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._indexes: dict[str, PerceptualIndex] = {}
+        self._synced_seq: dict[str, int] = {}
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Reconnect after fork - SQLite connections must not cross processes
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                """
+                -- Pre-window table that was never trimmed to the rotation
+                DROP TABLE IF EXISTS seen_hashes;
+                CREATE TABLE IF NOT EXISTS rotation (
+                    emotion TEXT PRIMARY KEY,
+                    next INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS recent_hashes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    emotion TEXT NOT NULL,
+                    hash INTEGER NOT NULL,
+                    slot INTEGER NOT NULL,
+                    UNIQUE (emotion, hash)
+                );
+                CREATE INDEX IF NOT EXISTS recent_hashes_emotion_seq ON recent_hashes (emotion, seq);
+                """
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+            self._indexes = {}
+            self._synced_seq = {}
+        return self._conn
+
+    def next_rotation(self, emotion: str) -> int:
+        """Atomically claim the next rotation slot for this emotion."""
+        with self._lock:
+            row = self.conn.execute(
+                "INSERT INTO rotation (emotion, next) VALUES (?, 1) "
+                "ON CONFLICT (emotion) DO UPDATE SET next = next + 1 "
+                "RETURNING next - 1",
+                (emotion,),
+            ).fetchone()
+        return row[0]
+
+    def seen_index(self, emotion: str, slot: int) -> PerceptualIndex:
+        """Local index of hashes seen in the window before `slot`, caught up with other workers' writes."""
+        with self._lock:
+            conn = self.conn
+            index = self._indexes.get(emotion)
+            if index is None:
+                index = self._indexes[emotion] = PerceptualIndex(seen_window(emotion) + 1, DUPLICATE_DISTANCE)
+
+            rows = conn.execute(
+                "SELECT seq, hash, slot FROM recent_hashes WHERE emotion = ? AND seq > ? ORDER BY seq",
+                (emotion, self._synced_seq.get(emotion, 0)),
+            ).fetchall()
+            for seq, value, seen_slot in rows:
+                index.add(value & ((1 << 64) - 1), seen_slot)
+                self._synced_seq[emotion] = seq
+            index.expire(slot - seen_window(emotion))
+            return index
+
+    def is_seen(self, emotion: str, value: int, slot: int) -> bool:
+        """Sync, then check for a near-duplicate (under the lock, so no concurrent index updates)."""
+        with self._lock:
+            return self.seen_index(emotion, slot).find_near(value) is not None
+
+    def mark_seen(self, emotion: str, value: int, slot: int) -> None:
+        """Record a hash as seen at `slot` and drop hashes that have left the window."""
+        signed = _to_signed64(value)
+        with self._lock, self.conn as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Re-inserting moves the hash to the newest seq, so other workers pick up the new slot
+            conn.execute("DELETE FROM recent_hashes WHERE emotion = ? AND hash = ?", (emotion, signed))
+            conn.execute(
+                "INSERT INTO recent_hashes (emotion, hash, slot) VALUES (?, ?, ?)", (emotion, signed, slot)
+            )
+            conn.execute(
+                "DELETE FROM recent_hashes WHERE emotion = ? AND slot < ?",
+                (emotion, slot - seen_window(emotion)),
+            )
+
+    def index_size(self) -> int:
+        """Hashes held in this process's local indexes (for metrics)."""
+        with self._lock:
+            return sum(len(index) for index in self._indexes.values())
+
+
+# Track used photos per emotion for round-robin (no repeats)
+_state = SharedState(STATE_DB)
+
+
+# ==================================================
+# 📈 METRICS
+# ==================================================
+TIER_SERVED = REGISTRY.counter(
+    "wallpaper_tier_served", "Which tier served each get_wallpaper call", ("tier",)
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "upstream_fetch_duration_seconds", "Upstream image fetch latency", ("upstream",)
+)
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "upstream_fetch_errors", "Failed upstream fetches", ("upstream", "reason")
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "cache_lookups", "Cache lookups by result (hit ratio = hit / (hit + miss))", ("cache", "result")
+)
+
+
+def collect_cache_sizes() -> dict[tuple[str], int]:
+    """Computed at scrape time so the hot path never pays for it."""
+    return {
+        ("wallpapers",): sum(1 for _ in CACHE_DIR.glob("*/*.jpg")),
+        # Skip in-flight temp files and render locks
+        ("variants",): sum(1 for p in CACHE_DIR.glob("*/variants/*") if p.suffix in MEDIA_TYPES),
+        ("offline_pool",): sum(len(pool) for pool in _offline_pool.values()),
+        ("seen_hashes",): _state.index_size(),
+    }
+
+
+REGISTRY.gauge("cache_entries", "Entries per cache", ("cache",), collect=collect_cache_sizes)
+
+
 async def fetch_emotion_image(emotion: str, attempt: int = 0) -> bytes | None:
     """
     Fetch wallpaper using DIRECT CDN URLs - 100% guaranteed to match emotion.
@@ -215,41 +544,36 @@ async def fetch_emotion_image(emotion: str, attempt: int = 0) -> bytes | None:
     """
     urls = DIRECT_IMAGE_URLS.get(emotion, DIRECT_IMAGE_URLS["neutral"])
     
-    if emotion not in _used_indices:
-        _used_indices[emotion] = 0
-    
-    url = urls[_used_indices[emotion] % len(urls)]
-    _used_indices[emotion] += 1
+    slot = await run_in_threadpool(_state.next_rotation, emotion)
+    url = urls[slot % len(urls)].replace(UNSPLASH_CDN, UNSPLASH_CDN_URL, 1)
     
     try:
         async with httpx.AsyncClient(follow_redirects=True, timeout=12.0) as client:
-            response = await client.get(url)
-            if response.status_code == 200:
+            with UPSTREAM_LATENCY.time(upstream="unsplash"):
+                response = await client.get(url)
+            if response.status_code != 200:
+                UPSTREAM_ERRORS.inc(upstream="unsplash", reason=f"http_{response.status_code}")
+            else:
                 image_bytes = response.content
                 
-                if emotion not in _seen_hashes:
-                    _seen_hashes[emotion] = set()
-                
-                img_hash = get_image_hash(image_bytes)
-                
-                if img_hash in _seen_hashes[emotion]:
-                    if attempt < MAX_RETRIES:
-                        print(f"[{emotion}] Same image, trying next URL...")
-                        return await fetch_emotion_image(emotion, attempt + 1)
-                    else:
-                        return image_bytes
+                img_hash = await run_in_threadpool(get_perceptual_hash, image_bytes)
                 
-                _seen_hashes[emotion].add(img_hash)
+                # Past one full rotation every URL is a repeat - serve it rather than keep fetching
+                max_retries = min(MAX_RETRIES, seen_window(emotion))
+                if attempt < max_retries and await run_in_threadpool(_state.is_seen, emotion, img_hash, slot):
+                    logger.info("Same image, trying next URL", extra={"emotion": emotion, "attempt": attempt})
+                    return await fetch_emotion_image(emotion, attempt + 1)
                 
-                if len(_seen_hashes[emotion]) > 100:
-                    _seen_hashes[emotion] = set(list(_seen_hashes[emotion])[-50:])
+                # Also refreshes a served repeat, so it is the last to age out
+                await run_in_threadpool(_state.mark_seen, emotion, img_hash, slot)
                 
                 photo_id = url.split("photo-")[1].split("?")[0] if "photo-" in url else "unknown"
-                print(f"[{emotion}] ✓ Fetched: photo-{photo_id[:12]}...")
+                logger.info("Fetched", extra={"emotion": emotion, "photo": f"photo-{photo_id}"})
                 return image_bytes
                 
     except Exception as e:
-        print(f"Fetch failed for {emotion}: {e}")
+        UPSTREAM_ERRORS.inc(upstream="unsplash", reason=type(e).__name__)
+        logger.warning("Fetch failed", extra={"emotion": emotion, "error": str(e)})
     
     return None
 
@@ -265,53 +589,280 @@ async def fetch_semantic_fallback(emotion: str) -> bytes | None:
     prompt = f"{term}, highly detailed, 8k wallpaper, cinematic lighting, {seed}"
     encoded_prompt = prompt.replace(" ", "%20")
     
-    url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=1920&height=1080&nologo=true"
+    url = f"{POLLINATIONS_API_URL}/prompt/{encoded_prompt}?width=1920&height=1080&nologo=true"
     
     try:
-        print(f"[{emotion}] 🎨 Generating AI Wallpaper: {term}...")
+        logger.info("Generating AI wallpaper", extra={"emotion": emotion, "term": term})
         async with httpx.AsyncClient(follow_redirects=True, timeout=20.0) as client:
-            response = await client.get(url)
+            with UPSTREAM_LATENCY.time(upstream="pollinations"):
+                response = await client.get(url)
             if response.status_code == 200:
-                print(f"[{emotion}] ✓ AI Generation Success")
+                logger.info("AI generation succeeded", extra={"emotion": emotion})
                 return response.content
+            UPSTREAM_ERRORS.inc(upstream="pollinations", reason=f"http_{response.status_code}")
     except Exception as e:
-        print(f"AI Generation failed: {e}")
-        pass
+        UPSTREAM_ERRORS.inc(upstream="pollinations", reason=type(e).__name__)
+        logger.warning("AI generation failed", extra={"emotion": emotion, "error": str(e)})
     return None
 
 
-FALLBACK_COLORS = {
-    "happy": ((255, 200, 100), (255, 150, 50)),
-    "sad": ((30, 50, 90), (60, 100, 150)),
-    "angry": ((150, 30, 30), (220, 60, 60)),
-    "fear": ((20, 30, 50), (50, 70, 100)),
-    "surprise": ((200, 150, 255), (255, 180, 200)),
-    "disgust": ((70, 80, 50), (120, 130, 90)),
-    "neutral": ((180, 180, 180), (140, 140, 140)),
-}
+def generate_fallback_wallpaper(emotion: str, size: tuple[int, int] = DEFAULT_SIZE, fmt: str = "JPEG") -> bytes:
+    """Render a procedural wallpaper (backend/wallpaper.py, 20 recipes) and encode it."""
+    with RENDER_DURATION.time(kind="procedural"):
+        img = generate_wallpaper(emotion, size=size)
+    return encode_image(img, fmt)
 
-def generate_fallback_wallpaper(emotion: str) -> bytes:
-    """Generate a simple gradient fallback"""
-    colors = FALLBACK_COLORS.get(emotion, FALLBACK_COLORS["neutral"])
-    c1, c2 = colors
-    
-    width, height = 1920, 1080
-    arr = np.zeros((height, width, 3), dtype=np.uint8)
-    
-    # Vertical gradient
-    for i in range(3):
-        gradient = np.linspace(c1[i], c2[i], height)
-        arr[:, :, i] = gradient.astype(np.uint8)[:, None]
-    
-    img = Image.fromarray(arr)
+
+# ==================================================
+# 🧊 OFFLINE POOL (pre-rendered procedural wallpapers)
+# ==================================================
+OFFLINE_POOL_SIZE = 4
+
+_offline_pool: dict[str, deque[bytes]] = {emotion: deque() for emotion in EMOTIONS}
+_refilling: set[str] = set()
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def refill_offline_pool(emotion: str) -> None:
+    """Top up one emotion's pool, rendering off the event loop."""
+    if emotion in _refilling:
+        return
+    _refilling.add(emotion)
+    try:
+        pool = _offline_pool[emotion]
+        while len(pool) < OFFLINE_POOL_SIZE:
+            pool.append(await run_in_threadpool(generate_fallback_wallpaper, emotion))
+    finally:
+        _refilling.discard(emotion)
+
+
+async def fill_offline_pool() -> None:
+    """Startup task: render every emotion's pool, one emotion at a time."""
+    for emotion in EMOTIONS:
+        try:
+            await refill_offline_pool(emotion)
+        except Exception:
+            logger.exception("Offline pool fill failed", extra={"emotion": emotion})
+
+
+def schedule_refill(emotion: str) -> None:
+    task = asyncio.create_task(refill_offline_pool(emotion))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def take_offline_wallpaper(emotion: str, options: EmotionRequest) -> bytes:
+    """
+    Offline tier: pre-encoded default-size JPEG from the pool (memory speed),
+    or a fresh render when a variant is requested or the pool is still warming up.
+    """
+    pool = _offline_pool[emotion]
+    image_bytes = pool.popleft() if pool and not options.wants_variant else None
+    if len(pool) < OFFLINE_POOL_SIZE:
+        schedule_refill(emotion)
+    if image_bytes is not None:
+        CACHE_LOOKUPS.inc(cache="offline_pool", result="hit")
+        return image_bytes
+
+    CACHE_LOOKUPS.inc(cache="offline_pool", result="miss")
+
+    size = fallback_size(options.width, options.height)
+    return await run_in_threadpool(generate_fallback_wallpaper, emotion, size, options.format or "JPEG")
+
+
+# ==================================================
+# 🖼️ VARIANTS (resize / transcode + derivative cache)
+# ==================================================
+# key -> [lock, number of coroutines holding or waiting on it]
+_variant_locks: dict[str, list] = {}
+
+
+def encode_image(img: Image.Image, fmt: str) -> bytes:
+    """Encode with the per-format settings from OUTPUT_FORMATS."""
+    _, _, options = OUTPUT_FORMATS[fmt]
     buf = io.BytesIO()
-    img.save(buf, format="JPEG", quality=90)
-    buf.seek(0)
-    return buf.read()
+    with ENCODE_DURATION.time(format=fmt):
+        img.save(buf, format=fmt, **options)
+    return buf.getvalue()
+
+
+def resolve_target_size(src_w: int, src_h: int, width: int | None, height: int | None) -> tuple[int, int]:
+    """
+    Work out the output size for a variant.
+    Both given: exact size (cover crop). One given: keep source aspect.
+    Never upscales - oversized targets shrink to fit the source, keeping their aspect.
+    """
+    if width is None and height is None:
+        return src_w, src_h
+    if width is None:
+        width = round(src_w * height / src_h)
+    elif height is None:
+        height = round(src_h * width / src_w)
+
+    scale = min(1.0, src_w / width, src_h / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def cover_box(src_w: int, src_h: int, dst_w: int, dst_h: int) -> tuple[float, float, float, float]:
+    """Centered crop box in source coordinates matching the target aspect."""
+    src_ratio = src_w / src_h
+    dst_ratio = dst_w / dst_h
+    if src_ratio > dst_ratio:
+        crop_w = src_h * dst_ratio
+        left = (src_w - crop_w) / 2
+        return left, 0, left + crop_w, src_h
+    crop_h = src_w / dst_ratio
+    top = (src_h - crop_h) / 2
+    return 0, top, src_w, top + crop_h
+
+
+def render_variant(source: Path, width: int | None, height: int | None, fmt: str) -> bytes:
+    """
+    Resize + transcode a cached source image.
+    JPEG sources are decoded at reduced size via draft() (DCT scaling),
+    then resized from the cropped box with reducing_gap for a fast first pass.
+    """
+    with RENDER_DURATION.time(kind="variant"), Image.open(source) as img:
+        src_w, src_h = img.size
+        dst_w, dst_h = resolve_target_size(src_w, src_h, width, height)
+        box = cover_box(src_w, src_h, dst_w, dst_h)
+
+        # Ask the decoder for the smallest scale that still covers the crop at target size
+        box_w, box_h = box[2] - box[0], box[3] - box[1]
+        img.draft("RGB", (int(dst_w * src_w / box_w) + 1, int(dst_h * src_h / box_h) + 1))
+
+        # draft() may have shrunk the image; map the crop box to the decoded size
+        sx, sy = img.size[0] / src_w, img.size[1] / src_h
+        box = (box[0] * sx, box[1] * sy, box[2] * sx, box[3] * sy)
+
+        out = img.convert("RGB").resize(
+            (dst_w, dst_h), Image.Resampling.LANCZOS, box=box, reducing_gap=2.0
+        )
+    return encode_image(out, fmt)
+
+
+@lru_cache(maxsize=4096)
+def source_size(source: Path) -> tuple[int, int]:
+    """Header-only read; sources are content-addressed so the size never changes."""
+    with Image.open(source) as img:
+        return img.size
+
+
+def variant_path(source: Path, size: tuple[int, int], fmt: str) -> Path:
+    """Derivative cache key: source hash + resolved output size + format/quality."""
+    ext, _, options = OUTPUT_FORMATS[fmt]
+    name = f"{source.stem}-{size[0]}x{size[1]}-q{options.get('quality', 0)}{ext}"
+    return source.parent / "variants" / name
+
+
+@asynccontextmanager
+async def variant_lock(key: str):
+    """Per-key asyncio lock, dropped from the dict only once nobody holds or awaits it."""
+    entry = _variant_locks.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _variant_locks[key]
+
+
+async def acquire_render_lock(path: Path) -> Path | None:
+    """
+    Cross-worker guard: O_EXCL lock file next to the variant.
+    Returns the lock path once held, or None if another worker produced the file meanwhile.
+    """
+    lock_path = path.with_name(f".{path.name}.lock")
+    while True:
+        if path.exists():
+            return None
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return lock_path
+        except FileExistsError:
+            pass
+        try:
+            if time.time() - lock_path.stat().st_mtime > VARIANT_LOCK_STALE_S:
+                lock_path.unlink(missing_ok=True)
+                continue
+        except FileNotFoundError:
+            continue
+        await asyncio.sleep(0.05)
+
+
+def evict_variants(variant_dir: Path) -> None:
+    """Keep at most MAX_VARIANTS_PER_EMOTION files, dropping the least recently used (atime)."""
+    files = [p for p in variant_dir.iterdir() if p.suffix in MEDIA_TYPES]
+    if len(files) <= MAX_VARIANTS_PER_EMOTION:
+        return
+    files.sort(key=lambda p: p.stat().st_atime)
+    for stale in files[: len(files) - MAX_VARIANTS_PER_EMOTION]:
+        stale.unlink(missing_ok=True)
+
+
+def render_and_store(source: Path, path: Path, size: tuple[int, int], fmt: str) -> None:
+    image_bytes = render_variant(source, size[0], size[1], fmt)
+    path.parent.mkdir(exist_ok=True)
+    write_atomic(path, image_bytes)
+    evict_variants(path.parent)
 
 
-async def get_wallpaper(emotion: str) -> bytes:
-    """Fetch matching wallpaper with multi-tier fallback."""
+def touch_variant(path: Path) -> None:
+    """Mark as recently used for eviction (atime only, so Last-Modified stays put)."""
+    os.utime(path, (time.time(), path.stat().st_mtime))
+
+
+async def get_variant(source: Path, width: int | None, height: int | None, fmt: str | None) -> Path:
+    """Return the cached variant file, rendering it at most once across all workers."""
+    fmt = fmt or "JPEG"
+    src_w, src_h = source_size(source)
+    size = resolve_target_size(src_w, src_h, width, height)
+    if size == (src_w, src_h) and fmt == "JPEG":
+        # Identical to the original - don't store a copy
+        return source
+
+    path = variant_path(source, size, fmt)
+    if path.exists():
+        CACHE_LOOKUPS.inc(cache="variants", result="hit")
+        touch_variant(path)
+        return path
+
+    path.parent.mkdir(exist_ok=True)
+    async with variant_lock(str(path)):
+        lock_path = await acquire_render_lock(path)
+        if lock_path is None:
+            # Rendered by another request / worker while we waited
+            CACHE_LOOKUPS.inc(cache="variants", result="hit")
+            return path
+        try:
+            CACHE_LOOKUPS.inc(cache="variants", result="miss")
+            await run_in_threadpool(render_and_store, source, path, size, fmt)
+        finally:
+            lock_path.unlink(missing_ok=True)
+    return path
+
+
+def fallback_size(width: int | None, height: int | None) -> tuple[int, int]:
+    """Generated wallpapers have no source to fit, so render straight at the requested size."""
+    if width is None and height is None:
+        return DEFAULT_SIZE
+    if width is None:
+        width = round(height * DEFAULT_SIZE[0] / DEFAULT_SIZE[1])
+    elif height is None:
+        height = round(width * DEFAULT_SIZE[1] / DEFAULT_SIZE[0])
+    return width, height
+
+
+async def get_wallpaper(emotion: str, options: EmotionRequest | None = None) -> Path | bytes:
+    """
+    Fetch matching wallpaper with multi-tier fallback.
+    Returns the cache file path for cache-backed tiers (served zero-copy),
+    or raw bytes for the generated fallback.
+    If options asks for a size/format, cache-backed tiers return the derivative file.
+    """
+    options = options or EmotionRequest(emotion=emotion)
     emotion = emotion.lower()
     if emotion not in EMOTIONS:
         emotion = "neutral"
@@ -321,26 +872,100 @@ async def get_wallpaper(emotion: str) -> bytes:
     
     # 1. Fetch Direct
     image_bytes = await fetch_emotion_image(emotion)
+    tier = "direct"
     
     # 2. Fallback Semantic
     if not image_bytes:
         image_bytes = await fetch_semantic_fallback(emotion)
+        tier = "semantic"
     
     if image_bytes:
+        TIER_SERVED.inc(tier=tier)
         # Cache it
         content_hash = get_image_hash(image_bytes)
         cache_file = emotion_cache_dir / f"{content_hash}.jpg"
         if not cache_file.exists():
-            cache_file.write_bytes(image_bytes)
-        return image_bytes
+            write_atomic(cache_file, image_bytes)
+        return await serve_variant(cache_file, options)
     
     # 3. Cache Fallback
     cached_images = list(emotion_cache_dir.glob("*.jpg"))
     if cached_images:
-        return random.choice(cached_images).read_bytes()
+        TIER_SERVED.inc(tier="disk_cache")
+        return await serve_variant(random.choice(cached_images), options)
     
-    # 4. Generate
-    return generate_fallback_wallpaper(emotion)
+    # 4. Generate (procedural, pre-rendered pool)
+    TIER_SERVED.inc(tier="offline")
+    return await take_offline_wallpaper(emotion, options)
+
+
+async def serve_variant(source: Path, options: EmotionRequest) -> Path:
+    """Original file unless a size/format variant was requested."""
+    if not options.wants_variant:
+        return source
+    return await get_variant(source, options.width, options.height, options.format)
+
+
+# ==================================================
+# 📦 RESPONSE HELPERS
+# ==================================================
+def make_etag(content_hash: str) -> str:
+    """Strong ETag from the content hash (same hash used for cache filenames)."""
+    return f'"{content_hash}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match covers this ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def is_conditional_method(request: Request) -> bool:
+    """304 and Range only apply to GET / HEAD (RFC 9110 §13.1.2, §14.2)."""
+    return request.method in ("GET", "HEAD")
+
+
+class NoRangeFileResponse(FileResponse):
+    """FileResponse that ignores Range / If-Range (for POST responses)."""
+
+    async def __call__(self, scope, receive, send):
+        headers = [(k, v) for k, v in scope["headers"] if k not in (b"range", b"if-range")]
+        await super().__call__({**scope, "headers": headers}, receive, send)
+
+
+def serve_cached_file(request: Request, path: Path, headers: dict, cache_control: str) -> Response:
+    """
+    Serve a content-addressed cache file.
+    For GET / HEAD: handles If-None-Match (304); FileResponse handles Range / If-Range.
+    Uses the server's pathsend extension when available instead of copying through Python.
+    """
+    etag = make_etag(path.stem)
+    headers = {**headers, "ETag": etag, "Cache-Control": cache_control}
+    media_type = MEDIA_TYPES[path.suffix]
+
+    if not is_conditional_method(request):
+        return NoRangeFileResponse(path, media_type=media_type, headers={**headers, "Accept-Ranges": "none"})
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+def serve_generated_bytes(request: Request, image_bytes: bytes, headers: dict, media_type: str) -> Response:
+    """Serve in-memory bytes (generated fallback) with the same validators as cached files."""
+    etag = make_etag(get_image_hash(image_bytes))
+    headers = {**headers, "ETag": etag, "Cache-Control": EMOTION_CACHE_CONTROL}
+
+    if is_conditional_method(request) and etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=image_bytes, media_type=media_type, headers=headers)
 
 
 # ==================================================
@@ -351,37 +976,67 @@ async def emotion_wallpaper(
     request: Request
 ):
     """
-    Accepts JSON: { "emotion": "happy" }
-    Returns: JPG Image Bytes
+    Accepts JSON: { "emotion": "happy", "width": 1170, "height": 2532, "format": "webp" }
+    width / height / format are optional (default: original JPEG).
+    Returns: Image Bytes
     """
     try:
         # Handle JSON (Client-Side AI)
         content_type = request.headers.get('content-type', '')
         if 'application/json' in content_type:
             data = await request.json()
-            emotion = data.get("emotion", "neutral")
-            print(f"API Request: {emotion}")
+            try:
+                options = EmotionRequest(**data)
+            except ValidationError as e:
+                return JSONResponse(status_code=400, content={"error": str(e)})
+            emotion = options.emotion
+            logger.info("API request", extra={"emotion": emotion})
         else:
             # Handle Legacy File Upload (Deprecated)
             # We just ignore the file and return neutral/random to prevent crash
-            print("API Request: Legacy File Upload (Ignoring content)")
+            logger.info("API request: legacy file upload (ignoring content)")
             emotion = "neutral"
+            options = EmotionRequest(emotion=emotion)
 
         # Fetch wallpaper
-        wallpaper_bytes = await get_wallpaper(emotion)
+        wallpaper = await get_wallpaper(emotion, options)
+        headers = {"X-Detected-Emotion": emotion}
 
-        return Response(
-            content=wallpaper_bytes,
-            media_type="image/jpeg",
-            headers={"X-Detected-Emotion": emotion},
-        )
+        if isinstance(wallpaper, Path):
+            # Point clients at the immutable URL so repeat views can be cached
+            headers["Content-Location"] = f"/api/wallpapers/{wallpaper.relative_to(CACHE_DIR).as_posix()}"
+            return serve_cached_file(request, wallpaper, headers, EMOTION_CACHE_CONTROL)
+
+        _, media_type, _ = OUTPUT_FORMATS[options.format or "JPEG"]
+        return serve_generated_bytes(request, wallpaper, headers, media_type)
     except Exception as e:
-        print(f"API Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("API error")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
+@app.get("/api/wallpapers/{emotion}/{filename:path}")
+async def cached_wallpaper(emotion: str, filename: str, request: Request):
+    """
+    Serve a cached wallpaper (or variant) by its content-addressed filename.
+    Safe to cache forever: the filename is the content hash (+ variant parameters).
+    """
+    if emotion not in EMOTIONS:
+        return JSONResponse(status_code=404, content={"error": "Unknown emotion"})
+
+    emotion_dir = (CACHE_DIR / emotion).resolve()
+    path = (emotion_dir / filename).resolve()
+    if emotion_dir not in path.parents or path.suffix not in MEDIA_TYPES or not path.is_file():
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+
+    return serve_cached_file(request, path, {"X-Detected-Emotion": emotion}, IMMUTABLE_CACHE_CONTROL)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition (per worker process)."""
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "mode": "client-side-ai"}
@@ -1,15 +1,46 @@
 from fastapi import FastAPI, UploadFile, File, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
+from contextlib import asynccontextmanager
 from PIL import Image
+import asyncio
 import io
 
 from model import detect_emotion
 from wallpaper import generate_wallpaper
+from observability import (
+    REGISTRY, PROMETHEUS_CONTENT_TYPE, ENCODE_DURATION, RENDER_DURATION,
+    add_request_metrics, monitor_event_loop_lag, get_logger,
+)
+
+logger = get_logger("emotion_wallpaper_api")
+
+INFERENCE_DURATION = REGISTRY.histogram(
+    "inference_duration_seconds", "detect_emotion model inference time"
+)
+PREDICTED_MOODS = REGISTRY.counter(
+    "predicted_moods", "Detected moods", ("mood",)
+)
+
+
+def timed_detect_emotion(img: Image.Image):
+    with INFERENCE_DURATION.time():
+        mood, confidence = detect_emotion(img)
+    PREDICTED_MOODS.inc(mood=mood)
+    return mood, confidence
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lag_task = asyncio.create_task(monitor_event_loop_lag())
+    yield
+    lag_task.cancel()
+
 
 app = FastAPI(
     title="Emotion Wallpaper API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -19,6 +50,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+add_request_metrics(app)
 
 # -------------------- EMOTION PREDICTION --------------------
 
@@ -28,7 +60,8 @@ async def predict(file: UploadFile = File(...)):
     Detect emotion from a face image
     """
     img = Image.open(file.file).convert("RGB")
-    mood, confidence = detect_emotion(img)
+    mood, confidence = timed_detect_emotion(img)
+    logger.info("Predicted", extra={"mood": mood, "confidence": round(confidence, 3)})
 
     return {
         "mood": mood,
@@ -52,14 +85,17 @@ async def wallpaper(
     img = Image.open(file.file).convert("RGB")
 
     # Detect mood again (keeps API stateless)
-    mood, _ = detect_emotion(img)
+    mood, _ = timed_detect_emotion(img)
 
     # Generate rich wallpaper (20-style engine)
-    wp = generate_wallpaper(mood, seed=seed)
+    with RENDER_DURATION.time(kind="procedural"):
+        wp = generate_wallpaper(mood, seed=seed)
 
     buf = io.BytesIO()
-    wp.save(buf, format="PNG")
+    with ENCODE_DURATION.time(format="PNG"):
+        wp.save(buf, format="PNG")
     buf.seek(0)
+    logger.info("Wallpaper generated", extra={"mood": mood, "seed": seed})
 
     return StreamingResponse(
         buf,
@@ -69,3 +105,12 @@ async def wallpaper(
             "X-Seed": str(seed) if seed is not None else "random"
         }
     )
+
+# -------------------- METRICS --------------------
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text exposition (per worker process)
+    """
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -83,12 +83,11 @@ STYLE_RECIPES = [
 
 # ---------- MAIN GENERATOR ----------
 
-def generate_wallpaper(mood: str, seed: int | None = None):
+def generate_wallpaper(mood: str, seed: int | None = None, size: tuple[int, int] = (1920, 1080)):
     if seed is not None:
         random.seed(seed)
         np.random.seed(seed)
 
-    size = (1920, 1080)
     palette = PALETTES[mood]
     img = Image.new("RGB", size, palette[0])
 
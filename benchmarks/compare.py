@@ -0,0 +1,53 @@
+# benchmarks/compare.py
+# Compare two result files from benchmarks.load / benchmarks.micro.
+#
+#   python -m benchmarks.compare benchmarks/results/micro-A.json benchmarks/results/micro-B.json
+import argparse
+import json
+import sys
+
+# metric -> True if higher is better
+METRICS = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "throughput_rps": True,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    if baseline["suite"] != candidate["suite"]:
+        sys.exit(f"Suite mismatch: {baseline['suite']} vs {candidate['suite']}")
+
+    regressions = 0
+    print(f"{'benchmark':<22} {'metric':<15} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for name, before in baseline["results"].items():
+        after = candidate["results"].get(name)
+        if after is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = before.get(metric), after.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100.0
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > args.threshold else ""
+            regressions += bool(flag)
+            print(f"{name:<22} {metric:<15} {old:>12.2f} {new:>12.2f} {change:>+8.1f}%{flag}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# benchmarks/load.py
+# Concurrent load against app.py (/api/emotion) and backend/main.py (/predict, /wallpaper),
+# all in-process, with upstreams replaced by benchmarks/stub_upstream.py.
+#
+#   python -m benchmarks.load --concurrency 16 --requests 200 --failure-rate 0.1
+import argparse
+import asyncio
+import importlib
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import ServerThread, save_results, summarize_ms
+from benchmarks.stub_upstream import StubConfig, create_stub_app
+
+ROOT = Path(__file__).resolve().parent.parent
+FACE_IMAGE = ROOT / "test_face.jpg"
+EMOTIONS = ["angry", "disgust", "fear", "happy", "neutral", "sad", "surprise"]
+
+# -------------------- APP STARTUP --------------------
+
+def start_wallpaper_app(stub_url: str, workdir: Path, pool_timeout: float = 120.0) -> tuple[ServerThread, float]:
+    """
+    Import app.py against the stub and a throwaway cache / state DB.
+    Returns once the lifespan's offline pool fill has finished (so it doesn't
+    compete with the measured requests for CPU), with the seconds spent waiting.
+    """
+    os.environ["UNSPLASH_CDN_URL"] = stub_url
+    os.environ["POLLINATIONS_API_URL"] = stub_url
+    os.environ["WALLPAPER_CACHE_DIR"] = str(workdir / "wallpapers")
+    os.environ["EMOTION_STATE_DB"] = str(workdir / "state.sqlite3")
+    sys.path.insert(0, str(ROOT))
+    module = importlib.import_module("app")
+    server = ServerThread(module.app).start()
+
+    start = time.perf_counter()
+    deadline = start + pool_timeout
+    while any(len(pool) < module.OFFLINE_POOL_SIZE for pool in module._offline_pool.values()):
+        if time.perf_counter() > deadline:
+            server.stop()
+            raise RuntimeError(f"Offline pool not filled within {pool_timeout}s")
+        time.sleep(0.05)
+    return server, time.perf_counter() - start
+
+
+def set_app_log_level(level: str) -> None:
+    # Per-request INFO logs would dominate the output (and the measurement)
+    for name in ("emotion_wallpaper", "emotion_wallpaper_api"):
+        logging.getLogger(name).setLevel(level)
+
+
+def start_model_app() -> ServerThread:
+    """backend/main.py imports its siblings as top-level modules."""
+    sys.path.insert(0, str(ROOT / "backend"))
+    module = importlib.import_module("main")
+    return ServerThread(module.app).start(timeout=120.0)
+
+# -------------------- LOAD DRIVER --------------------
+
+async def drive(client: httpx.AsyncClient, make_request, concurrency: int, total: int) -> dict:
+    """Run `total` requests with `concurrency` in flight; make_request(i) -> (method, url, kwargs)."""
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < total:
+            method, url, kwargs = make_request(i)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                status = str(response.status_code)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall_start
+
+    return {
+        **summarize_ms(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+    }
+
+
+def emotion_request(base_url: str, extra: dict | None = None):
+    def make(i):
+        body = {"emotion": EMOTIONS[i % len(EMOTIONS)], **(extra or {})}
+        return "POST", f"{base_url}/api/emotion", {"json": body}
+    return make
+
+
+def upload_request(base_url: str, path: str):
+    face = FACE_IMAGE.read_bytes()
+
+    def make(i):
+        return "POST", f"{base_url}{path}", {"files": {"file": ("face.jpg", face, "image/jpeg")}}
+    return make
+
+
+async def run_scenarios(scenarios: dict, args) -> dict:
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        for name, make_request in scenarios.items():
+            if args.warmup:
+                await drive(client, make_request, min(args.concurrency, args.warmup), args.warmup)
+            print(f"[load] {name}: {args.requests} requests @ concurrency {args.concurrency}")
+            results[name] = await drive(client, make_request, args.concurrency, args.requests)
+            r = results[name]
+            print(
+                f"[load]   {r['throughput_rps']} req/s  p50 {r.get('p50_ms')}ms  "
+                f"p95 {r.get('p95_ms')}ms  p99 {r.get('p99_ms')}ms  errors {r['errors']}"
+            )
+    return results
+
+# -------------------- MAIN --------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark for the wallpaper APIs")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per scenario")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--upstream-latency-ms", type=float, default=80.0)
+    parser.add_argument("--upstream-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="Fraction of upstream requests that 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING", help="Log level for the apps under test")
+    parser.add_argument("--skip-model", action="store_true", help="Don't start backend/main.py (needs torch + model)")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/load-<time>.json)")
+    args = parser.parse_args()
+
+    stub_config = StubConfig(args.upstream_latency_ms, args.upstream_jitter_ms, args.failure_rate, args.seed)
+    stub_app = create_stub_app(stub_config)
+    stub = ServerThread(stub_app).start()
+    servers = [stub]
+    skipped = {}
+
+    with tempfile.TemporaryDirectory(prefix="wallpaper-bench-") as workdir:
+        try:
+            wallpaper_app, pool_wait = start_wallpaper_app(stub.url, Path(workdir))
+            servers.append(wallpaper_app)
+            print(f"[load] Offline pool filled after {pool_wait:.1f}s")
+            scenarios = {
+                "api_emotion": emotion_request(wallpaper_app.url),
+                "api_emotion_variant": emotion_request(
+                    wallpaper_app.url, {"width": 1170, "height": 2532, "format": "webp"}
+                ),
+            }
+
+            if args.skip_model:
+                skipped["model_app"] = "--skip-model"
+            else:
+                try:
+                    model_app = start_model_app()
+                    servers.append(model_app)
+                    scenarios["predict"] = upload_request(model_app.url, "/predict")
+                    scenarios["wallpaper"] = upload_request(model_app.url, "/wallpaper")
+                except Exception as e:
+                    # torch / transformers / model weights unavailable
+                    skipped["model_app"] = f"{type(e).__name__}: {e}"
+                    print(f"[load] Skipping /predict and /wallpaper: {skipped['model_app']}")
+
+            set_app_log_level(args.log_level)
+            results = asyncio.run(run_scenarios(scenarios, args))
+        finally:
+            for server in reversed(servers):
+                server.stop()
+
+    results["upstream_stub"] = {"requests": stub_app.state.requests, "failures": stub_app.state.failures}
+    config = {k: v for k, v in vars(args).items() if k != "output"}
+    config["skipped"] = skipped
+    # Measurement starts only after the startup pool render is done
+    config["offline_pool_prefilled"] = True
+    config["offline_pool_wait_s"] = round(pool_wait, 3)
+    path = save_results("load", config, results, args.output)
+    print(f"[load] Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# benchmarks/micro.py
+# Microbenchmarks: every wallpaper recipe, grain, PNG/JPEG encoding, detect_emotion.
+#
+#   python -m benchmarks.micro --repeat 10 --mood sad
+import argparse
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.common import save_results, summarize_ms
+
+ROOT = Path(__file__).resolve().parent.parent
+FACE_IMAGE = ROOT / "test_face.jpg"
+
+sys.path.insert(0, str(ROOT / "backend"))
+from wallpaper import PALETTES, STYLE_RECIPES, grain, soft_shapes  # noqa: E402
+
+
+def bench(fn, repeat: int, setup=None) -> dict:
+    """Time fn(setup()) `repeat` times; setup is excluded from the timing."""
+    samples = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg) if setup else fn()
+        samples.append(time.perf_counter() - start)
+    return summarize_ms(samples)
+
+
+def encode(img: Image.Image, fmt: str, **options) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **options)
+    return buf.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for wallpaper rendering and inference")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mood", default="happy", choices=sorted(PALETTES))
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-model", action="store_true", help="Skip detect_emotion (needs torch + model)")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/micro-<time>.json)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+
+    size = (args.width, args.height)
+    palette = PALETTES[args.mood]
+    blank = lambda: Image.new("RGB", size, palette[0])  # noqa: E731
+    results = {}
+    skipped = {}
+
+    # -------------------- RECIPES --------------------
+    for i, recipe in enumerate(STYLE_RECIPES):
+        results[f"recipe_{i:02d}"] = bench(lambda img, r=recipe: r(img, palette), args.repeat, blank)
+
+    results["grain"] = bench(grain, args.repeat, blank)
+
+    # -------------------- ENCODING --------------------
+    # A textured wallpaper, so encoders see realistic entropy
+    sample = grain(soft_shapes(blank(), palette))
+    results["encode_png"] = bench(lambda: encode(sample, "PNG"), args.repeat)
+    results["encode_jpeg_q85"] = bench(lambda: encode(sample, "JPEG", quality=85), args.repeat)
+    results["encode_jpeg_q90"] = bench(lambda: encode(sample, "JPEG", quality=90), args.repeat)
+
+    # -------------------- INFERENCE --------------------
+    if args.skip_model:
+        skipped["detect_emotion"] = "--skip-model"
+    else:
+        try:
+            from model import detect_emotion
+        except Exception as e:
+            # torch / transformers / model weights unavailable
+            skipped["detect_emotion"] = f"{type(e).__name__}: {e}"
+        else:
+            face = Image.open(FACE_IMAGE).convert("RGB")
+            detect_emotion(face)  # warm-up
+            results["detect_emotion"] = bench(lambda: detect_emotion(face), args.repeat)
+
+    for name, stats in results.items():
+        print(f"[micro] {name:<18} median {stats['p50_ms']:>9.2f}ms  min {stats['min_ms']:>9.2f}ms")
+    for name, reason in skipped.items():
+        print(f"[micro] {name:<18} skipped ({reason})")
+
+    config = {k: v for k, v in vars(args).items() if k != "output"}
+    config["skipped"] = skipped
+    path = save_results("micro", config, results, args.output)
+    print(f"[micro] Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# benchmarks/stub_upstream.py
+# Local stand-in for the Unsplash CDN and Pollinations API.
+import asyncio
+import io
+import random
+import zlib
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+from PIL import Image
+
+POOL_SIZE = 64
+
+
+def make_image(seed: int, size: tuple[int, int] = (1920, 1080)) -> bytes:
+    """
+    Smooth random color field - cheap to make, and distinct images get
+    distinct perceptual hashes (so dedupe behaves like it does on real photos).
+    """
+    rng = np.random.default_rng(seed)
+    grid = rng.integers(0, 256, size=(9, 16, 3), dtype=np.uint8)
+    img = Image.fromarray(grid).resize(size, Image.Resampling.BICUBIC)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 80.0, jitter_ms: float = 20.0, failure_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+
+
+def create_stub_app(config: StubConfig) -> FastAPI:
+    """
+    Every GET returns a JPEG after the configured latency, or a 503 at failure_rate.
+    The same path always maps to the same image, like a photo ID on the CDN.
+    """
+    app = FastAPI(title="Upstream stub")
+    images = [make_image(seed) for seed in range(POOL_SIZE)]
+    app.state.requests = 0
+    app.state.failures = 0
+
+    @app.get("/{path:path}")
+    async def serve(path: str, request: Request):
+        app.state.requests += 1
+        delay = config.rng.gauss(config.latency_ms, config.jitter_ms) / 1000.0
+        await asyncio.sleep(max(0.0, delay))
+
+        if config.rng.random() < config.failure_rate:
+            app.state.failures += 1
+            return Response(status_code=503)
+
+        key = f"{path}?{request.url.query}" if path.startswith("prompt/") else path
+        return Response(content=images[zlib.crc32(key.encode()) % POOL_SIZE], media_type="image/jpeg")
+
+    return app
@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+# app.py lives at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Keep app.py's import-time cache dir / state DB out of the working tree
+_workdir = tempfile.mkdtemp(prefix="wallpaper-tests-")
+os.environ.setdefault("WALLPAPER_CACHE_DIR", str(Path(_workdir) / "wallpapers"))
+os.environ.setdefault("EMOTION_STATE_DB", str(Path(_workdir) / "state.sqlite3"))
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "CACHE_DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def cached_source(cache_dir):
+    """A 400x300 JPEG stored the way get_wallpaper stores downloads."""
+    import app
+
+    buffer = BytesIO()
+    Image.new("RGB", (400, 300), (200, 80, 40)).save(buffer, "JPEG", quality=90)
+    data = buffer.getvalue()
+    path = cache_dir / "happy" / f"{app.get_image_hash(data)}.jpg"
+    path.parent.mkdir()
+    path.write_bytes(data)
+    return path
@@ -0,0 +1,60 @@
+import random
+
+from app import PerceptualIndex
+
+
+def flip_bits(value: int, count: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def brute_force_near(values, query: int, max_distance: int) -> bool:
+    return any((v ^ query).bit_count() <= max_distance for v in values)
+
+
+def test_find_near_matches_brute_force():
+    rng = random.Random(0)
+    index = PerceptualIndex(capacity=500, max_distance=10)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    for value in values:
+        index.add(value)
+
+    for _ in range(2000):
+        query = flip_bits(rng.choice(values), rng.randrange(16), rng)
+        found = index.find_near(query)
+        assert (found is not None) == brute_force_near(values, query, 10)
+        if found is not None:
+            assert (found ^ query).bit_count() <= 10
+
+
+def test_evicts_least_recently_used():
+    index = PerceptualIndex(capacity=3, max_distance=4)
+    a, b, c, d = 0x00000000FFFFFFFF, 0, 0xFFFFFFFF00000000, 0xAAAAAAAAAAAAAAAA
+    for value in (a, b, c):
+        index.add(value)
+    index.add(a)  # refresh: b is now the oldest
+    index.add(d)
+
+    assert len(index) == 3
+    assert index.find_near(b) is None
+    assert index.find_near(a) == a
+    assert index.find_near(c) == c
+    assert index.find_near(d) == d
+    # Evicted hashes leave no empty buckets behind
+    assert all(bucket for buckets in index._buckets for bucket in buckets.values())
+
+
+def test_expire_drops_old_stamps():
+    index = PerceptualIndex(capacity=10, max_distance=4)
+    a, b, c = 0x00000000FFFFFFFF, 0, 0xFFFFFFFF00000000
+    index.add(a, stamp=1)
+    index.add(b, stamp=2)
+    index.add(c, stamp=3)
+    index.add(a, stamp=4)  # a re-seen later: keeps the newer stamp
+
+    index.expire(3)
+    assert len(index) == 2
+    assert index.find_near(b) is None
+    assert index.find_near(a) == a
+    assert index.find_near(c) == c
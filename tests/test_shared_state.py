@@ -0,0 +1,81 @@
+import multiprocessing as mp
+import random
+import sqlite3
+
+import app
+from app import SharedState
+
+
+def claim_slots(args):
+    path, count = args
+    state = SharedState(path)
+    return [state.next_rotation("sad") for _ in range(count)]
+
+
+def test_rotation_slots_are_unique_across_processes(tmp_path):
+    db = tmp_path / "state.sqlite3"
+    with mp.get_context("spawn").Pool(4) as pool:
+        results = pool.map(claim_slots, [(db, 50)] * 4)
+
+    slots = sorted(slot for result in results for slot in result)
+    assert slots == list(range(200))
+
+
+def test_recent_hashes_expire_after_window(tmp_path):
+    db = tmp_path / "state.sqlite3"
+    writer, reader = SharedState(db), SharedState(db)
+    window = app.seen_window("fear")
+
+    # Far apart (no near-duplicates); half are >= 2**63, which SQLite stores as negative integers
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(63) | ((i % 2) << 63) for i in range(window + 3)]
+    for slot, value in enumerate(hashes):
+        writer.mark_seen("fear", value, slot)
+    last = len(hashes) - 1
+
+    rows = writer.conn.execute("SELECT hash, slot FROM recent_hashes WHERE emotion = 'fear' ORDER BY seq").fetchall()
+    assert [slot for _, slot in rows] == list(range(last - window, last + 1))
+    assert [value & ((1 << 64) - 1) for value, _ in rows] == hashes[last - window:]
+
+    # Another worker picks up the writes through its own connection;
+    # at the next slot the oldest stored hash has left the window too
+    assert not reader.is_seen("fear", hashes[last - window], last + 1)
+    assert all(reader.is_seen("fear", value, last + 1) for value in hashes[last - window + 1:])
+
+    # Re-seeing a hash moves it back into the window
+    writer.mark_seen("fear", hashes[0], last + 1)
+    assert reader.is_seen("fear", hashes[0], last + 2)
+
+
+def test_fresh_state_after_full_rotation_sees_only_the_window(tmp_path):
+    db = tmp_path / "state.sqlite3"
+    writer = SharedState(db)
+    rotation = len(app.DIRECT_IMAGE_URLS["sad"])
+
+    rng = random.Random(1)
+    hashes = []
+    for _ in range(rotation):
+        slot = writer.next_rotation("sad")
+        hashes.append(rng.getrandbits(64))
+        writer.mark_seen("sad", hashes[-1], slot)
+
+    # A new worker (or a restart) starting the second rotation
+    fresh = SharedState(db)
+    slot = fresh.next_rotation("sad")
+    assert slot == rotation
+    assert not fresh.is_seen("sad", hashes[0], slot)
+    assert all(fresh.is_seen("sad", value, slot) for value in hashes[1:])
+
+    # The table never grows past one rotation
+    count = fresh.conn.execute("SELECT COUNT(*) FROM recent_hashes WHERE emotion = 'sad'").fetchone()[0]
+    assert count == rotation
+
+
+def test_drops_legacy_unbounded_table(tmp_path):
+    db = tmp_path / "state.sqlite3"
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TABLE seen_hashes (seq INTEGER PRIMARY KEY, emotion TEXT, hash INTEGER)")
+
+    tables = {row[0] for row in SharedState(db).conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "seen_hashes" not in tables
+    assert "recent_hashes" in tables
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from PIL import Image
+
+import app
+
+
+@pytest.mark.parametrize(
+    "width, height, expected",
+    [
+        (None, None, (400, 300)),
+        (200, 100, (200, 100)),
+        (200, None, (200, 150)),  # one side given: keep source aspect
+        (None, 150, (200, 150)),
+        (800, 600, (400, 300)),  # never upscale
+        (1600, 600, (400, 150)),  # oversized target shrinks but keeps its aspect
+        (3840, None, (400, 300)),
+    ],
+)
+def test_resolve_target_size(width, height, expected):
+    assert app.resolve_target_size(400, 300, width, height) == expected
+
+
+def test_cover_box_is_centered_and_matches_target_aspect():
+    # Wider source than target: crop the sides
+    left, top, right, bottom = app.cover_box(400, 300, 100, 100)
+    assert (left, top, right, bottom) == (50, 0, 350, 300)
+
+    # Taller target than source: crop top and bottom
+    left, top, right, bottom = app.cover_box(400, 300, 400, 100)
+    assert (left, right) == (0, 400)
+    assert top == pytest.approx(100) and bottom == pytest.approx(200)
+
+
+def test_variant_matching_original_returns_source(cached_source):
+    # Oversized request clamps to the source size
+    path = asyncio.run(app.get_variant(cached_source, 800, 600, "JPEG"))
+    assert path == cached_source
+    assert not (cached_source.parent / "variants").exists()
+
+
+def test_variant_is_rendered_at_resolved_size(cached_source):
+    path = asyncio.run(app.get_variant(cached_source, 200, None, "WEBP"))
+    assert path.parent == cached_source.parent / "variants"
+    assert path.suffix == ".webp"
+    with Image.open(path) as img:
+        assert img.size == (200, 150)
+
+
+def test_concurrent_variant_requests_render_once(cached_source, monkeypatch):
+    calls = []
+    render = app.render_variant
+
+    def counting_render(*args):
+        calls.append(args)
+        return render(*args)
+
+    monkeypatch.setattr(app, "render_variant", counting_render)
+
+    async def request_many():
+        # Different requested sizes that resolve to the same variant
+        return await asyncio.gather(
+            *(app.get_variant(cached_source, 100, 75, "JPEG") for _ in range(4)),
+            app.get_variant(cached_source, 100, None, "JPEG"),
+        )
+
+    paths = asyncio.run(request_many())
+    assert len(set(paths)) == 1
+    assert len(calls) == 1
+    assert paths[0].is_file()
+    assert not list(paths[0].parent.glob("*.lock"))
@@ -0,0 +1,93 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import app
+
+
+def make_request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, False),
+        ('"abc"', True),
+        ('"other"', False),
+        ("*", True),
+        ('W/"abc"', True),
+        ('"x", W/"abc" , "y"', True),
+        ('"x", "y"', False),
+    ],
+)
+def test_etag_matches(header, expected):
+    assert app.etag_matches(make_request(header), '"abc"') is expected
+
+
+@pytest.fixture
+def client():
+    # No context manager: skip the lifespan (offline pool fill, lag monitor)
+    return TestClient(app.app)
+
+
+@pytest.fixture
+def no_upstream(monkeypatch):
+    async def unavailable(emotion, *args):
+        return None
+
+    monkeypatch.setattr(app, "fetch_emotion_image", unavailable)
+    monkeypatch.setattr(app, "fetch_semantic_fallback", unavailable)
+
+
+def test_cached_wallpaper_conditional_and_range(client, cached_source):
+    url = f"/api/wallpapers/happy/{cached_source.name}"
+    etag = f'"{cached_source.stem}"'
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == app.IMMUTABLE_CACHE_CONTROL
+    assert response.content == cached_source.read_bytes()
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(url, headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.content == cached_source.read_bytes()[:10]
+
+    # Stale If-Range: whole file
+    response = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/api/wallpapers/happy/..%2F..%2Fconftest.py",
+        "/api/wallpapers/happy/%2E%2E/%2E%2E/state.jpg",
+        "/api/wallpapers/nope/x.jpg",
+        "/api/wallpapers/happy/missing.jpg",
+    ],
+)
+def test_cached_wallpaper_rejects_paths_outside_cache(client, cached_source, url):
+    # A real file one level up that the traversal would reach
+    (cached_source.parent.parent.parent / "state.jpg").write_bytes(b"secret")
+    assert client.get(url).status_code == 404
+
+
+def test_emotion_post_ignores_conditional_and_range(client, cached_source, no_upstream):
+    response = client.post("/api/emotion", json={"emotion": "happy"})
+    assert response.status_code == 200
+    assert response.headers["content-location"] == f"/api/wallpapers/happy/{cached_source.name}"
+    etag = response.headers["etag"]
+
+    response = client.post(
+        "/api/emotion", json={"emotion": "happy"}, headers={"If-None-Match": etag, "Range": "bytes=0-9"}
+    )
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "none"
+    assert response.content == cached_source.read_bytes()